@@ -1,11 +1,22 @@
+import os
 import re
-import json
-from typing import Optional
+import threading
+from hashlib import blake2b
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import diskcache
+import numpy as np
+import orjson
 
 import streamlit as st
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
-import language_tool_python
-import plotly.graph_objects as go
+from vaderSentiment.vaderSentiment import BOOSTER_DICT, SentimentIntensityAnalyzer, SentiText
+
+try:
+    import hyperscan
+except ImportError:  # no wheels on some platforms (e.g. Windows); fall back to `re`
+    hyperscan = None
 
 # =========================
 #  PAGE CONFIG
@@ -21,27 +32,85 @@ st.set_page_config(
 #  CACHED TOOLS
 # =========================
 
+class TranscriptSentimentAnalyzer(SentimentIntensityAnalyzer):
+    """VADER analyzer that skips the per-character emoji pass for plain-ASCII text."""
+
+    def polarity_scores(self, text):
+        # VADER's emoji lexicon only has non-ASCII keys, so ASCII text comes out
+        # of its character-by-character translation loop unchanged
+        if not text.isascii():
+            return super().polarity_scores(text)
+        return self.polarity_scores_from_sentitext(SentiText(text.strip()))
+
+    # Mirrors the body of SentimentIntensityAnalyzer.polarity_scores after the
+    # emoji pass, as of vaderSentiment 3.3.2 (pinned in requirements.txt);
+    # re-check against upstream before bumping that pin
+    def polarity_scores_from_sentitext(self, sentitext):
+        sentiments = []
+        words_and_emoticons = sentitext.words_and_emoticons
+        for i, item in enumerate(words_and_emoticons):
+            valence = 0
+            # Boosters and "kind of" carry no valence of their own
+            if item.lower() in BOOSTER_DICT:
+                sentiments.append(valence)
+                continue
+            if (i < len(words_and_emoticons) - 1 and item.lower() == "kind" and
+                    words_and_emoticons[i + 1].lower() == "of"):
+                sentiments.append(valence)
+                continue
+            sentiments = self.sentiment_valence(valence, sentitext, item, i, sentiments)
+
+        sentiments = self._but_check(words_and_emoticons, sentiments)
+        return self.score_valence(sentiments, sentitext.text)
+
 @st.cache_resource
 def load_sentiment_analyzer():
-    return SentimentIntensityAnalyzer()
+    return TranscriptSentimentAnalyzer()
+
+# Server-side caching for the LanguageTool backend
+GRAMMAR_TOOL_CONFIG = {
+    "cacheSize": 1000,
+    "pipelineCaching": True,
+    "maxCheckThreads": 4
+}
+
+# URL of a shared LanguageTool HTTP server, e.g. http://localhost:8081.
+# Unset = each Streamlit worker spawns its own local JVM.
+LANGUAGETOOL_SERVER = os.environ.get("LANGUAGETOOL_SERVER")
 
 @st.cache_resource
 def load_grammar_tool():
-    # English grammar checker
-    return language_tool_python.LanguageTool('en-US')
+    # English grammar checker. Imported here so the JVM only starts on the
+    # first grammar check, not on every Streamlit worker start.
+    import language_tool_python
+    if LANGUAGETOOL_SERVER:
+        # Server-side caching is configured on the shared server itself
+        return language_tool_python.LanguageTool('en-US', remote_server=LANGUAGETOOL_SERVER)
+    return language_tool_python.LanguageTool('en-US', config=GRAMMAR_TOOL_CONFIG)
+
+@st.cache_resource
+def load_grammar_cache():
+    # Error counts keyed by transcript digest; survives app restarts
+    return diskcache.Cache("./.grammar_cache")
 
 sentiment_analyzer = load_sentiment_analyzer()
-grammar_tool = load_grammar_tool()
 
 # =========================
 #  RUBRIC CONSTANTS (HARDCODED)
 # =========================
 
-FILLER_WORDS = {
+FILLER_WORDS = frozenset({
     "um", "uh", "like", "you know", "so", "actually", "basically",
     "right", "i mean", "well", "kinda", "sort of", "okay", "ok",
     "hmm", "ah"
-}
+})
+
+# Single-word fillers are counted from tokens; multi-word ones ("you know",
+# "i mean", "sort of") can never match a single token, so scan text for them
+FILLER_SINGLE = frozenset(w for w in FILLER_WORDS if " " not in w)
+FILLER_MULTI_RE = re.compile(
+    r"\b(?:" + "|".join(re.escape(w) for w in sorted(FILLER_WORDS) if " " in w) + r")\b"
+)
 
 # Must-have items (each 4 points, total 20 max)
 MUST_HAVE_PATTERNS = {
@@ -63,16 +132,53 @@ GOOD_TO_HAVE_PATTERNS = {
 }
 GOOD_TO_HAVE_POINTS = 2
 
+# Flat parallel arrays over all keyword items (must-have first, then
+# good-to-have); each key's patterns are joined into one compiled alternation
+KEYWORD_KEYS = tuple(MUST_HAVE_PATTERNS) + tuple(GOOD_TO_HAVE_PATTERNS)
+KEYWORD_RES = [
+    re.compile("|".join(pats))
+    for pats in list(MUST_HAVE_PATTERNS.values()) + list(GOOD_TO_HAVE_PATTERNS.values())
+]
+KEYWORD_POINTS = np.array(
+    [MUST_HAVE_POINTS] * len(MUST_HAVE_PATTERNS) + [GOOD_TO_HAVE_POINTS] * len(GOOD_TO_HAVE_PATTERNS),
+    dtype=np.int32
+)
+N_MUST_HAVE = len(MUST_HAVE_PATTERNS)
+
 # Salutation levels
-NORMAL_SALUTATIONS = ["hi", "hello"]
-GOOD_SALUTATIONS = [
+NORMAL_SALUTATIONS = frozenset({"hi", "hello"})
+GOOD_SALUTATIONS = frozenset({
     "good morning", "good afternoon", "good evening",
     "good day", "hello everyone", "hi everyone"
-]
-EXCELLENT_PHRASES = [
+})
+EXCELLENT_PHRASES = frozenset({
     "i am excited to introduce", "feeling great",
     "i'm excited to introduce", "i am excited to be here"
-]
+})
+
+EXCELLENT_RE = re.compile("|".join(re.escape(p) for p in sorted(EXCELLENT_PHRASES)))
+GOOD_SALUTATION_RE = re.compile("|".join(re.escape(p) for p in sorted(GOOD_SALUTATIONS)))
+NORMAL_SALUTATION_RE = re.compile(r"\b(?:" + "|".join(re.escape(s) for s in sorted(NORMAL_SALUTATIONS)) + r")\b")
+
+# Flow sections, in the order they are expected to appear
+FLOW_SECTION_PHRASES = {
+    "sal": sorted(NORMAL_SALUTATIONS | GOOD_SALUTATIONS),
+    "basic": ["my name is", "i am", "i'm", "years old", "school", "class", "grade"],
+    "add": ["hobby", "hobbies", "fun fact", "goal", "dream", "family"],
+    "close": ["thank you", "thanks for listening", "that's all", "that is all"]
+}
+
+def _flow_alternative(phrase: str) -> str:
+    # Hi/Hello are whole words only ("hi" must not match inside "this")
+    if phrase in NORMAL_SALUTATIONS:
+        return r"\b" + re.escape(phrase) + r"\b"
+    return re.escape(phrase)
+
+# One alternation per section; .search() returns its leftmost (first) match
+FLOW_SECTION_RES = {
+    section: re.compile("|".join(_flow_alternative(p) for p in phrases))
+    for section, phrases in FLOW_SECTION_PHRASES.items()
+}
 
 # Max points per rubric area (for display)
 MAX_POINTS = {
@@ -87,38 +193,41 @@ MAX_POINTS = {
 #  TEXT UTILITIES
 # =========================
 
-def tokenize_words(text: str):
-    text_lower = text.lower()
-    tokens = re.findall(r"\b\w+\b", text_lower)
-    return tokens
+WORD_RE = re.compile(r"\b\w+\b")
+
+# Every ASCII non-word character maps to a space, so for ASCII input
+# translate() + split() yields exactly the same tokens as WORD_RE
+_ASCII_NON_WORD_TO_SPACE = str.maketrans({
+    chr(c): " " for c in range(128) if not (chr(c).isalnum() or chr(c) == "_")
+})
 
-def compute_word_count(text: str) -> int:
-    return len(tokenize_words(text))
+def tokenize_words(text_lower: str):
+    # Expects already-lowercased text (see score_transcript)
+    if text_lower.isascii():
+        return text_lower.translate(_ASCII_NON_WORD_TO_SPACE).split()
+    # Unicode text keeps the regex so non-ASCII letters/punctuation split correctly
+    return WORD_RE.findall(text_lower)
 
-def find_any_pattern(text_lower: str, patterns):
-    for pat in patterns:
-        if re.search(pat, text_lower):
-            return True
-    return False
+def find_any_pattern(text_lower: str, compiled):
+    return bool(compiled.search(text_lower))
 
 # =========================
 #  SALUTATION SCORE (0–5)
 # =========================
 
-def get_salutation_score(text: str):
-    tl = text.lower()
+def get_salutation_score(tl: str):
     reason = "No salutation detected."
 
     # Excellent
-    if any(phrase in tl for phrase in EXCELLENT_PHRASES):
+    if EXCELLENT_RE.search(tl):
         return 5, "Excellent salutation (excited/feeling great) detected."
 
     # Good
-    if any(phrase in tl for phrase in GOOD_SALUTATIONS):
+    if GOOD_SALUTATION_RE.search(tl):
         return 4, "Good salutation (Good morning/afternoon/evening etc.) detected."
 
     # Normal
-    if any(re.search(r"\b" + re.escape(s) + r"\b", tl) for s in NORMAL_SALUTATIONS):
+    if NORMAL_SALUTATION_RE.search(tl):
         return 2, "Normal salutation (Hi/Hello) detected."
 
     return 0, reason
@@ -127,23 +236,59 @@ def get_salutation_score(text: str):
 #  KEYWORD PRESENCE (0–30)
 # =========================
 
-def get_keyword_presence_score(text: str):
-    tl = text.lower()
-    must_have_present = {}
-    good_to_have_present = {}
+def _regex_presence_mask(tl: str):
+    return np.fromiter(
+        (find_any_pattern(tl, compiled) for compiled in KEYWORD_RES),
+        dtype=np.uint8, count=len(KEYWORD_RES)
+    )
+
+# Hyperscan scratch space can't be shared between concurrent scans (batch mode)
+_hyperscan_local = threading.local()
+
+def _hyperscan_presence_mask(db, tl: str):
+    scratch = getattr(_hyperscan_local, "scratch", None)
+    if scratch is None:
+        scratch = _hyperscan_local.scratch = hyperscan.Scratch(db)
+
+    present = np.zeros(len(KEYWORD_RES), dtype=np.uint8)
+
+    def on_match(pattern_id, start, end, flags, context):
+        present[pattern_id] = 1
+
+    db.scan(tl.encode(), match_event_handler=on_match, scratch=scratch)
+    return present
+
+@st.cache_resource
+def load_keyword_db():
+    # All keyword alternations in one Hyperscan database: one pass over the
+    # text reports every item present, instead of one regex search per item.
+    # Hyperscan rejects \b in UCP mode, so the database is compiled with
+    # ASCII word boundaries and only used for ASCII text.
+    if hyperscan is None:
+        return None
+    db = hyperscan.Database()
+    try:
+        db.compile(
+            expressions=[compiled.pattern.encode() for compiled in KEYWORD_RES],
+            ids=list(range(len(KEYWORD_RES))),
+            elements=len(KEYWORD_RES),
+            flags=[hyperscan.HS_FLAG_SINGLEMATCH] * len(KEYWORD_RES)
+        )
+    except hyperscan.error:
+        return None
+    return db
 
-    # Must-have
-    for key, patterns in MUST_HAVE_PATTERNS.items():
-        present = find_any_pattern(tl, patterns)
-        must_have_present[key] = present
+def keyword_presence_mask(tl: str):
+    db = load_keyword_db() if tl.isascii() else None
+    if db is None:
+        return _regex_presence_mask(tl)
+    return _hyperscan_presence_mask(db, tl)
 
-    # Good-to-have
-    for key, patterns in GOOD_TO_HAVE_PATTERNS.items():
-        present = find_any_pattern(tl, patterns)
-        good_to_have_present[key] = present
+def get_keyword_presence_score(tl: str):
+    present_mask = keyword_presence_mask(tl)  # uint8, one slot per keyword item
 
-    must_score = sum(1 for v in must_have_present.values() if v) * MUST_HAVE_POINTS
-    good_score = sum(1 for v in good_to_have_present.values() if v) * GOOD_TO_HAVE_POINTS
+    must_score = int(np.dot(present_mask[:N_MUST_HAVE], KEYWORD_POINTS[:N_MUST_HAVE]))
+    good_score = int(np.dot(present_mask[N_MUST_HAVE:], KEYWORD_POINTS[N_MUST_HAVE:]))
 
     # Cap scores exactly as rubric (20 for must, 10 for good)
     must_score = min(must_score, 20)
@@ -151,28 +296,28 @@ def get_keyword_presence_score(text: str):
 
     total_score = must_score + good_score  # max 30
 
+    # Plain dicts of Python bools for the JSON result
+    present_flags = present_mask.astype(bool).tolist()
+    must_have_present = dict(zip(KEYWORD_KEYS[:N_MUST_HAVE], present_flags[:N_MUST_HAVE]))
+    good_to_have_present = dict(zip(KEYWORD_KEYS[N_MUST_HAVE:], present_flags[N_MUST_HAVE:]))
+
     return total_score, must_have_present, good_to_have_present
 
 # =========================
 #  FLOW SCORE (0 or 5)
 # =========================
 
-def get_flow_score(text: str):
-    tl = text.lower()
-
-    # Approximate positions
-    def first_index_of_any(phrases):
-        idxs = []
-        for p in phrases:
-            pos = tl.find(p)
-            if pos != -1:
-                idxs.append(pos)
-        return min(idxs) if idxs else None
+def get_flow_score(tl: str):
+    # Approximate positions: first occurrence of each section
+    idx = {}
+    for section, compiled in FLOW_SECTION_RES.items():
+        m = compiled.search(tl)
+        idx[section] = m.start() if m else None
 
-    sal_index = first_index_of_any(NORMAL_SALUTATIONS + GOOD_SALUTATIONS)
-    basic_index = first_index_of_any(["my name is", "i am", "i'm", "years old", "school", "class", "grade"])
-    additional_index = first_index_of_any(["hobby", "hobbies", "fun fact", "goal", "dream", "family"])
-    closing_index = first_index_of_any(["thank you", "thanks for listening", "that's all", "that is all"])
+    sal_index = idx["sal"]
+    basic_index = idx["basic"]
+    additional_index = idx["add"]
+    closing_index = idx["close"]
 
     if None in (sal_index, basic_index, additional_index, closing_index):
         return 0, "Order not clearly followed (some sections missing)."
@@ -208,12 +353,27 @@ def get_speech_rate_score(word_count: int, duration_seconds: Optional[float]):
 #  GRAMMAR SCORE (0–10)
 # =========================
 
+# Below this many words the grammar check is not worth a LanguageTool call
+MIN_GRAMMAR_WORDS = 5
+
+def count_grammar_errors(text: str) -> int:
+    cache = load_grammar_cache()
+    key = blake2b(text.encode(), digest_size=16).digest()
+    error_count = cache.get(key)
+    if error_count is None:
+        error_count = len(load_grammar_tool().check(text))
+        cache[key] = error_count
+    return error_count
+
+# Identical transcripts never re-hit the JVM
+@st.cache_data(ttl=3600, max_entries=512, show_spinner=False)
 def get_grammar_score(text: str, word_count: int):
     if word_count == 0:
         return 0, 0.0, 0.0, "Empty text."
+    if word_count < MIN_GRAMMAR_WORDS:
+        return 2, 0, 0.0, f"Too short to score grammar (fewer than {MIN_GRAMMAR_WORDS} words)."
 
-    matches = grammar_tool.check(text)
-    error_count = len(matches)
+    error_count = count_grammar_errors(text)
     errors_per_100 = (error_count / word_count) * 100
 
     # Grammar quality:
@@ -238,13 +398,12 @@ def get_grammar_score(text: str, word_count: int):
 #  VOCABULARY RICHNESS (0–10) using TTR
 # =========================
 
-def get_vocabulary_score(text: str):
-    tokens = tokenize_words(text)
+def get_vocabulary_score(tokens, token_counts: Counter):
     word_count = len(tokens)
     if word_count == 0:
         return 0, 0.0, "Empty text."
 
-    distinct_count = len(set(tokens))
+    distinct_count = len(token_counts)
     ttr = distinct_count / word_count
 
     if 0.9 <= ttr <= 1.0:
@@ -265,16 +424,14 @@ def get_vocabulary_score(text: str):
 #  CLARITY / FILLER WORDS (0–15)
 # =========================
 
-def get_clarity_score(text: str):
-    tokens = tokenize_words(text)
+def get_clarity_score(text_lower: str, tokens, token_counts: Counter):
     word_count = len(tokens)
     if word_count == 0:
         return 0, 0, 0.0, "Empty text."
 
-    filler_count = 0
-    for t in tokens:
-        if t in FILLER_WORDS:
-            filler_count += 1
+    single_count = sum(token_counts[w] for w in FILLER_SINGLE & token_counts.keys())
+    multi_count = len(FILLER_MULTI_RE.findall(text_lower))
+    filler_count = single_count + multi_count
 
     filler_rate = (filler_count / word_count) * 100  # percentage
 
@@ -296,6 +453,7 @@ def get_clarity_score(text: str):
 #  ENGAGEMENT / SENTIMENT (0–15)
 # =========================
 
+@st.cache_data(ttl=3600, max_entries=512, show_spinner=False)
 def get_engagement_score(text: str):
     scores = sentiment_analyzer.polarity_scores(text)
     pos_prob = scores["pos"]  # 0–1
@@ -318,13 +476,21 @@ def get_engagement_score(text: str):
 #  OVERALL SCORING PIPELINE (STRICT RUBRIC)
 # =========================
 
+# Streamlit reruns the script on every widget interaction; identical
+# (text, duration) inputs reuse the previous result. Grammar and engagement
+# are cached separately so a new duration doesn't redo that work.
+@st.cache_data(ttl=3600, max_entries=128, show_spinner=False)
 def score_transcript(text: str, duration_seconds: Optional[float] = None):
-    word_count = compute_word_count(text)
+    # Lowercase and tokenize once; every sub-scorer reuses these
+    text_lower = text.lower()
+    tokens = tokenize_words(text_lower)
+    word_count = len(tokens)
+    token_counts = Counter(tokens)
 
     # ---- Content & Structure (40) ----
-    sal_score, sal_reason = get_salutation_score(text)
-    kw_score, must_have_present, good_to_have_present = get_keyword_presence_score(text)
-    flow_score, flow_reason = get_flow_score(text)
+    sal_score, sal_reason = get_salutation_score(text_lower)
+    kw_score, must_have_present, good_to_have_present = get_keyword_presence_score(text_lower)
+    flow_score, flow_reason = get_flow_score(text_lower)
     cs_total = sal_score + kw_score + flow_score  # max 40
 
     # ---- Speech Rate (10) ----
@@ -334,11 +500,11 @@ def score_transcript(text: str, duration_seconds: Optional[float] = None):
 
     # ---- Language & Grammar (20) ----
     grammar_score, err_count, err_per_100, grammar_fb = get_grammar_score(text, word_count)
-    vocab_score, ttr, vocab_fb = get_vocabulary_score(text)
+    vocab_score, ttr, vocab_fb = get_vocabulary_score(tokens, token_counts)
     lg_total = grammar_score + vocab_score  # max 20
 
     # ---- Clarity (15) ----
-    clarity_score, filler_count, filler_rate, clarity_fb = get_clarity_score(text)
+    clarity_score, filler_count, filler_rate, clarity_fb = get_clarity_score(text_lower, tokens, token_counts)
 
     # ---- Engagement (15) ----
     engagement_score_val, pos_prob, eng_fb = get_engagement_score(text)
@@ -434,11 +600,35 @@ def score_transcript(text: str, duration_seconds: Optional[float] = None):
 
     return result
 
+# =========================
+#  BATCH SCORING
+# =========================
+
+# Grammar checks dominate per-transcript latency; LanguageTool handles
+# concurrent checks (see maxCheckThreads in GRAMMAR_TOOL_CONFIG)
+BATCH_MAX_WORKERS = 4
+
+def score_transcripts(texts: List[str], durations: Optional[List[Optional[float]]] = None):
+    if durations is None:
+        durations = [None] * len(texts)
+
+    with ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS) as executor:
+        return list(executor.map(score_transcript, texts, durations))
+
+def parse_duration(value) -> Optional[float]:
+    try:
+        duration = float(value)
+    except (TypeError, ValueError):
+        return None
+    return duration if duration == duration else None  # NaN from empty CSV cells
+
 # =========================
 #  HELPER: GAUGE FIGURE
 # =========================
 
 def make_gauge(score: float):
+    import plotly.graph_objects as go
+
     fig = go.Figure(
         go.Indicator(
             mode="gauge+number",
@@ -637,7 +827,62 @@ if score_button:
 
             st.download_button(
                 "💾 Download JSON",
-                data=json.dumps(result, indent=2),
+                data=orjson.dumps(result, option=orjson.OPT_INDENT_2),
                 file_name="score_result.json",
                 mime="application/json"
             )
+
+# =========================
+#  BATCH SCORING (CSV)
+# =========================
+
+st.markdown("---")
+
+with st.expander("📂 Batch scoring (CSV upload)"):
+    st.write(
+        "Upload a CSV with a `transcript` column and an optional "
+        "`duration_seconds` column to score many introductions at once."
+    )
+    csv_file = st.file_uploader("CSV of transcripts", type=["csv"])
+
+    if csv_file is not None:
+        # Imported here so pandas doesn't add to every worker's cold start
+        import pandas as pd
+
+        try:
+            batch_df = pd.read_csv(csv_file)
+        except (pd.errors.EmptyDataError, pd.errors.ParserError, UnicodeDecodeError):
+            batch_df = None
+            st.error("❌ Could not read the CSV. Please upload a valid, non-empty CSV file.")
+
+        if batch_df is not None and "transcript" not in batch_df.columns:
+            st.error("❌ CSV must contain a `transcript` column.")
+        elif batch_df is not None:
+            batch_texts = batch_df["transcript"].fillna("").astype(str).tolist()
+            if "duration_seconds" in batch_df.columns:
+                batch_durations = [parse_duration(v) for v in batch_df["duration_seconds"]]
+            else:
+                batch_durations = None
+
+            with st.spinner(f"🔍 Scoring {len(batch_texts)} transcripts..."):
+                batch_results = score_transcripts(batch_texts, batch_durations)
+
+            summary_rows = []
+            for text, res in zip(batch_texts, batch_results):
+                row = {
+                    "transcript": text[:60] + ("..." if len(text) > 60 else ""),
+                    "overall_score": res["overall_score"],
+                    "word_count": res["word_count"],
+                }
+                for crit in res["criteria"]:
+                    row[crit["name"]] = crit["final_score"]
+                summary_rows.append(row)
+
+            st.dataframe(pd.DataFrame(summary_rows), use_container_width=True)
+
+            st.download_button(
+                "💾 Download batch JSON",
+                data=orjson.dumps(batch_results, option=orjson.OPT_INDENT_2),
+                file_name="batch_score_results.json",
+                mime="application/json"
+            )